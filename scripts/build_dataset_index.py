@@ -1,8 +1,9 @@
+import os
 import json
 import random
-import csv
 from pathlib import Path
 from collections import defaultdict
+import pandas as pd
 
 # ---------------- CONFIG ----------------
 
@@ -27,26 +28,42 @@ def extract_sample_id(filename: str) -> str:
     parts = filename.replace(".npy", "").split("_")
     return "_".join(parts[:3])  # class_sXX_tXX
 
+def find_feature_files(feature_dir: Path):
+    """
+    Collect (class_name, file_name, file_path) tuples for every
+    <feature_dir>/<class>/*.npy with a two-level os.scandir walk.
+    """
+    feature_files = []
+    with os.scandir(feature_dir) as class_entries:
+        for class_entry in class_entries:
+            if not class_entry.is_dir():
+                continue
+            with os.scandir(class_entry.path) as file_entries:
+                for file_entry in file_entries:
+                    if file_entry.name.endswith(".npy"):
+                        feature_files.append((class_entry.name, file_entry.name, file_entry.path))
+    return feature_files
+
 def main():
     random.seed(RANDOM_SEED)
 
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
     # Collect all feature files
-    feature_files = list(FEATURE_DIR.glob("*/*.npy"))
+    feature_files = find_feature_files(FEATURE_DIR)
     if not feature_files:
         raise RuntimeError("No .npy feature files found.")
 
     # Build class map
-    classes = sorted({f.parent.name for f in feature_files})
+    classes = sorted({class_name for class_name, _, _ in feature_files})
     class_map = {cls: idx for idx, cls in enumerate(classes)}
 
-    # Group files by sample_id
+    # Group (label, label_id, path) by sample_id; labels resolved once here
     samples = defaultdict(list)
 
-    for f in feature_files:
-        sample_id = extract_sample_id(f.name)
-        samples[sample_id].append(f)
+    for class_name, file_name, file_path in feature_files:
+        sample_id = extract_sample_id(file_name)
+        samples[sample_id].append((class_name, class_map[class_name], file_path))
 
     sample_ids = list(samples.keys())
     random.shuffle(sample_ids)
@@ -64,35 +81,33 @@ def main():
     assert train_ids.isdisjoint(test_ids)
     assert val_ids.isdisjoint(test_ids)
 
+    split_of = {sid: "train" for sid in train_ids}
+    split_of.update({sid: "val" for sid in val_ids})
+    split_of.update({sid: "test" for sid in test_ids})
+
     # Write dataset_index.csv
     index_path = OUTPUT_DIR / "dataset_index.csv"
 
-    with open(index_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "sample_id",
-            "feature_path",
-            "label",
-            "label_id",
-            "split"
-        ])
-
-        for sample_id, files in samples.items():
-            split = (
-                "train" if sample_id in train_ids else
-                "val" if sample_id in val_ids else
-                "test"
-            )
-
-            for feature_path in files:
-                label = feature_path.parent.name
-                writer.writerow([
-                    sample_id,
-                    str(feature_path.relative_to(PROJECT_ROOT)),
-                    label,
-                    class_map[label],
-                    split
-                ])
+    rows = []
+    for sample_id, files in samples.items():
+        split = split_of[sample_id]
+
+        for label, label_id, feature_path in files:
+            rows.append((
+                sample_id,
+                os.path.relpath(feature_path, PROJECT_ROOT),
+                label,
+                label_id,
+                split
+            ))
+
+    pd.DataFrame(rows, columns=[
+        "sample_id",
+        "feature_path",
+        "label",
+        "label_id",
+        "split"
+    ]).to_csv(index_path, index=False, encoding="utf-8")
 
     # Write class_map.json
     with open(OUTPUT_DIR / "class_map.json", "w", encoding="utf-8") as f:
@@ -5,11 +5,22 @@ Input: dataset_clean_slices/
 Output: dataset_features/logmel/
 """
 import os
+
+# One BLAS/OpenMP thread per process: the pool already uses every core. These are
+# only read when the libraries load, so they must be set before importing numpy;
+# workers inherit them from this process.
+for _var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+    os.environ.setdefault(_var, "1")
+
+import json
+import argparse
 import numpy as np
 import librosa
-import soundfile as sf
 from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
+from preprocess_and_slice import load_audio, SHARD_SUFFIX, PCM16_SCALE
 
 # --- Config ---
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -20,41 +31,123 @@ TARGET_SR = 16000
 N_MELS = 64            # Number of mel bands
 HOP_LENGTH = 256       # Frames hop length
 N_FFT = 512            # FFT window size
+AMIN = 1e-10           # Power floor before log (matches librosa.power_to_db)
+TOP_DB = 80.0          # Dynamic range below peak (matches librosa.power_to_db)
+FEATURE_DTYPE = np.float16  # On-disk dtype; -80..0 dB fits with ~0.03 dB resolution
+MAX_WORKERS = os.cpu_count()
+
+# Mel filterbank is identical for every slice, so build it once per process
+MEL_FB = librosa.filters.mel(sr=TARGET_SR, n_fft=N_FFT, n_mels=N_MELS).astype(np.float32)
+
+# --- Helper functions ---
+@lru_cache(maxsize=4)
+def get_buffers(n_frames: int):
+    """Preallocated (power, mel) float32 buffers keyed by frame count.
+    
+    All 2-second slices share one frame count, so in practice a single pair is reused.
+    """
+    power_buf = np.empty((N_FFT // 2 + 1, n_frames), dtype=np.float32)
+    mel_buf = np.empty((N_MELS, n_frames), dtype=np.float32)
+    return power_buf, mel_buf
+
+def compute_logmel(y):
+    """Convert audio waveform to log-mel spectrogram.
+    
+    Returns a reused buffer: save or copy it before the next call.
+    """
+    stft = librosa.stft(y.astype(np.float32, copy=False), n_fft=N_FFT, hop_length=HOP_LENGTH)
+    power_spec, mel_spec = get_buffers(stft.shape[1])
+    np.abs(stft, out=power_spec)
+    power_spec *= power_spec
+    np.matmul(MEL_FB, power_spec, out=mel_spec)
+
+    # Equivalent to librosa.power_to_db(mel_spec, ref=np.max), in place in float32
+    ref_db = 10.0 * np.log10(max(float(mel_spec.max()), AMIN))
+    np.maximum(mel_spec, AMIN, out=mel_spec)
+    np.log10(mel_spec, out=mel_spec)
+    mel_spec *= 10.0
+    mel_spec -= ref_db
+    np.maximum(mel_spec, -TOP_DB, out=mel_spec)
+    return mel_spec
+
+def extract_logmel(slice_path: Path, out_path: Path):
+    """Convert an audio slice to a log-mel spectrogram and save it as .npy."""
+    y, _ = load_audio(slice_path, sr=TARGET_SR)
+    np.save(out_path, compute_logmel(y).astype(FEATURE_DTYPE))
+    return out_path
 
-# --- Helper function ---
-def extract_logmel(y, sr):
-    """Convert audio waveform to log-mel spectrogram."""
-    mel_spec = librosa.feature.melspectrogram(
-        y=y,
-        sr=sr,
-        n_fft=N_FFT,
-        hop_length=HOP_LENGTH,
-        n_mels=N_MELS
-    )
-    log_mel_spec = librosa.power_to_db(mel_spec, ref=np.max)
-    return log_mel_spec.astype(np.float32)
+def extract_logmel_shard(shard_path: Path, feature_class_dir: Path, slice_ids):
+    """Extract log-mel features for the given windows of a slice shard (see preprocess_and_slice)."""
+    with open(shard_path.with_suffix(".json"), encoding="utf-8") as f:
+        sidecar = json.load(f)
+    if sidecar["sample_rate"] != TARGET_SR:
+        raise ValueError(f"expected {TARGET_SR} Hz shard, got {sidecar['sample_rate']} Hz")
+
+    shard = np.load(shard_path, mmap_mode='r')
+    row_of = {slice_id: i for i, slice_id in enumerate(sidecar["slice_ids"])}
+    for slice_id in slice_ids:
+        y = shard[row_of[slice_id]].astype(np.float32) / PCM16_SCALE
+        out_file = feature_class_dir / f"{sidecar['stem']}_{slice_id}.npy"
+        np.save(out_file, compute_logmel(y).astype(FEATURE_DTYPE))
+    return shard_path
 
 # --- Main pipeline ---
-def run_pipeline(slices_dir: Path, features_dir: Path):
+def run_pipeline(slices_dir: Path, features_dir: Path, force: bool = False):
+    """Extract features for every slice; existing .npy files are kept unless force is True."""
+    # Collect all pending (slice, feature) pairs up front so every core stays busy
+    jobs = []
+    shard_jobs = []
     for class_dir in slices_dir.iterdir():
         if not class_dir.is_dir():
             continue
-        class_name = class_dir.name
-        feature_class_dir = features_dir / class_name
+        feature_class_dir = features_dir / class_dir.name
         feature_class_dir.mkdir(parents=True, exist_ok=True)
 
-        slice_files = list(class_dir.glob("*.wav"))
-        for slice_file in tqdm(slice_files, desc=f"Processing {class_name}"):
+        # One directory listing per class instead of an exists() call per slice
+        existing = set() if force else {p.stem for p in feature_class_dir.glob("*.npy")}
+
+        for slice_file in class_dir.glob("*.wav"):
+            if slice_file.stem not in existing:
+                jobs.append((slice_file, feature_class_dir / f"{slice_file.stem}.npy"))
+                # Claim the output so a shard of the same recording can't write it concurrently
+                existing.add(slice_file.stem)
+
+        # Sharded recordings: one job per shard, covering only its missing (and unclaimed) windows
+        for shard_file in class_dir.glob(f"*{SHARD_SUFFIX}.npy"):
+            with open(shard_file.with_suffix(".json"), encoding="utf-8") as f:
+                sidecar = json.load(f)
+            pending = [
+                slice_id for slice_id in sidecar["slice_ids"]
+                if f"{sidecar['stem']}_{slice_id}" not in existing
+            ]
+            if pending:
+                shard_jobs.append((shard_file, feature_class_dir, pending))
+
+    if not jobs and not shard_jobs:
+        print(f"All features already extracted in {features_dir}")
+        return
+
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(extract_logmel, slice_file, out_file): slice_file
+            for slice_file, out_file in jobs
+        }
+        futures.update({
+            executor.submit(extract_logmel_shard, shard_file, feature_class_dir, pending): shard_file
+            for shard_file, feature_class_dir, pending in shard_jobs
+        })
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Extracting log-mel"):
             try:
-                y, sr = librosa.load(slice_file, sr=TARGET_SR, mono=True)
-                logmel = extract_logmel(y, sr)
-                # Save as numpy file
-                out_file = feature_class_dir / f"{slice_file.stem}.npy"
-                np.save(out_file, logmel)
+                future.result()
             except Exception as e:
-                print(f"Error processing {slice_file.name}: {e}")
+                print(f"Error processing {futures[future].name}: {e}")
 
     print(f"\nFeature extraction complete! Features saved in {features_dir}")
 
 if __name__ == "__main__":
-    run_pipeline(SLICES_DIR, FEATURES_DIR)
+    parser = argparse.ArgumentParser(description="Extract log-mel features from audio slices")
+    parser.add_argument('--force', '-f', action='store_true',
+                        help="Re-extract and overwrite existing .npy features (e.g. to convert old float32 files to float16)")
+    args = parser.parse_args()
+
+    run_pipeline(SLICES_DIR, FEATURES_DIR, force=args.force)
@@ -3,13 +3,30 @@ Script to analyze audio files and generate metadata with improved efficiency and
 Supports multiple audio formats including .m4a and provides detailed file metadata.
 """
 import os
-import csv
 import argparse
 import librosa
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import soundfile as sf
+import pandas as pd
 from pydub import AudioSegment
 from pathlib import Path
-from typing import Dict, Optional, Any, List
+from typing import Dict, Optional, Any, List, Tuple
+
+try:
+    import av  # PyAV: header-only probing of compressed formats
+except ImportError:
+    av = None
+
+def probe_with_av(audio_path: Path) -> Tuple[float, int, int]:
+    """Read (duration, channels, sample_rate) from the container header without decoding."""
+    with av.open(str(audio_path)) as container:
+        stream = container.streams.audio[0]
+        if container.duration is not None:
+            duration = container.duration / av.time_base
+        else:
+            duration = float(stream.duration * stream.time_base)
+        return duration, stream.channels, stream.rate
 
 def get_audio_metadata(audio_path: Path, estimate_duration: bool = True, max_duration: float = 10.0) -> Optional[Dict[str, Any]]:
     """Extract metadata from audio file with improved error handling and efficiency.
@@ -26,22 +43,31 @@ def get_audio_metadata(audio_path: Path, estimate_duration: bool = True, max_dur
         # Get basic file info
         file_size = os.path.getsize(audio_path)
         
-        # Try soundfile first, fall back to pydub if that fails
+        # Try soundfile first, then a PyAV header probe, then a full pydub decode
         try:
             with sf.SoundFile(str(audio_path)) as f:
                 duration = f.frames / f.samplerate
                 channels = f.channels
                 sr = f.samplerate
         except Exception:
-            # Fall back to pydub for unsupported formats like .m4a
-            try:
-                audio = AudioSegment.from_file(str(audio_path))
-                duration = len(audio) / 1000.0  # Convert ms to seconds
-                channels = audio.channels
-                sr = audio.frame_rate
-            except Exception as e:
-                print(f"Error processing {audio_path} with pydub: {str(e)}")
-                return None
+            probed = None
+            if av is not None:
+                try:
+                    probed = probe_with_av(audio_path)
+                except Exception as e:
+                    print(f"PyAV probe failed for {audio_path}, falling back to pydub: {str(e)}")
+            if probed:
+                duration, channels, sr = probed
+            else:
+                # Fall back to pydub for unsupported formats like .m4a
+                try:
+                    audio = AudioSegment.from_file(str(audio_path))
+                    duration = len(audio) / 1000.0  # Convert ms to seconds
+                    channels = audio.channels
+                    sr = audio.frame_rate
+                except Exception as e:
+                    print(f"Error processing {audio_path} with pydub: {str(e)}")
+                    return None
         
         # Extract class from parent directory name
         class_name = audio_path.parent.name
@@ -67,13 +93,16 @@ def get_audio_metadata(audio_path: Path, estimate_duration: bool = True, max_dur
         print(f"Error processing {audio_path}: {str(e)}")
         return None
 
+AUDIO_EXTENSIONS = {'.m4a', '.wav', '.mp3', '.flac', '.aac', '.ogg'}
+
 def find_audio_files(directory: Path) -> List[Path]:
-    """Find all audio files in directory with common extensions."""
-    audio_extensions = ['*.m4a', '*.wav', '*.mp3', '*.flac', '*.m4a', '*.aac', '*.ogg']
-    audio_files = []
-    for ext in audio_extensions:
-        audio_files.extend(directory.glob(f'**/{ext}'))
-    return audio_files
+    """Find all audio files in directory with common extensions (single tree walk)."""
+    return [
+        Path(root) / name
+        for root, _, names in os.walk(directory)
+        for name in names
+        if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+    ]
 
 def generate_metadata_csv(audio_dir: str, output_csv: str, estimate_duration: bool = True) -> None:
     """Generate metadata CSV for all audio files in directory.
@@ -89,8 +118,8 @@ def generate_metadata_csv(audio_dir: str, output_csv: str, estimate_duration: bo
     # Create output directory if it doesn't exist
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    # Find all audio files and remove duplicates by converting to set and back to list
-    audio_files = list(dict.fromkeys(find_audio_files(audio_dir)))
+    # Find all audio files (one walk, so each path appears once)
+    audio_files = find_audio_files(audio_dir)
     
     if not audio_files:
         print(f"No audio files found in {audio_dir}")
@@ -98,22 +127,11 @@ def generate_metadata_csv(audio_dir: str, output_csv: str, estimate_duration: bo
     
     print(f"Found {len(audio_files)} unique audio files to process...")
     
-    # Get metadata for all files
-    metadata = []
-    processed_paths = set()  # Track processed file paths
-    
-    for audio_file in audio_files:
-        # Skip if we've already processed this file
-        if str(audio_file) in processed_paths:
-            continue
-            
-        meta = get_audio_metadata(audio_file, estimate_duration=estimate_duration)
-        if meta:
-            # Only add if we haven't seen this file path before
-            if meta['file_path'] not in processed_paths:
-                metadata.append(meta)
-                processed_paths.add(meta['file_path'])
-                print(f"Processed: {audio_file}")
+    # Get metadata for all files concurrently; libsndfile/FFmpeg do the work outside the GIL
+    extract = partial(get_audio_metadata, estimate_duration=estimate_duration)
+    with ThreadPoolExecutor() as executor:
+        results = executor.map(extract, audio_files)
+        metadata = [meta for meta in results if meta]
     
     if not metadata:
         print("No valid audio files found to process")
@@ -130,10 +148,7 @@ def generate_metadata_csv(audio_dir: str, output_csv: str, estimate_duration: bo
     ]
     
     # Write to CSV
-    with open(output_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(metadata)
+    pd.DataFrame(metadata, columns=fieldnames).to_csv(output_path, index=False, encoding='utf-8')
     
     print(f"Generated metadata for {len(metadata)} files at {output_path}")
 
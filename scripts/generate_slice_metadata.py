@@ -1,8 +1,9 @@
-import csv
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
 from generate_metadata import find_audio_files
 import soundfile as sf
+import pandas as pd
 import os
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -31,17 +32,22 @@ def get_slice_metadata(audio_path: Path) -> Dict[str, Any]:
     }
 
 
+def try_get_slice_metadata(audio_path: Path) -> Optional[Dict[str, Any]]:
+    """Like get_slice_metadata, but reports and skips unreadable files."""
+    try:
+        return get_slice_metadata(audio_path)
+    except Exception as e:
+        print(f"Skipping {audio_path.name}: {e}")
+        return None
+
+
 def generate_slice_metadata():
     OUTPUT_CSV.parent.mkdir(parents=True, exist_ok=True)
 
     audio_files = find_audio_files(SLICES_DIR)
-    metadata = []
-
-    for audio_file in audio_files:
-        try:
-            metadata.append(get_slice_metadata(audio_file))
-        except Exception as e:
-            print(f"Skipping {audio_file.name}: {e}")
+    with ThreadPoolExecutor() as executor:
+        results = executor.map(try_get_slice_metadata, audio_files)
+        metadata = [meta for meta in results if meta]
 
     fieldnames = [
         "filename",
@@ -54,10 +60,7 @@ def generate_slice_metadata():
         "slice_id",
     ]
 
-    with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(metadata)
+    pd.DataFrame(metadata, columns=fieldnames).to_csv(OUTPUT_CSV, index=False, encoding="utf-8")
 
     print(f"Generated slice metadata for {len(metadata)} files")
 
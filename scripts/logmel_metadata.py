@@ -3,14 +3,28 @@ Script to generate metadata for log-mel spectrogram features (.npy) slices.
 Extracts class, sample ID, task ID, slice ID, shape, and duration.
 """
 import os
-import csv
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Any, List
 import numpy as np
+import pandas as pd
 
 # --- Helper functions ---
 
+def read_npy_shape(feature_path: Path) -> tuple:
+    """Read the array shape from a .npy header without loading the data payload."""
+    with open(feature_path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, _ = np.lib.format.read_array_header_1_0(f)
+            return shape
+        if version == (2, 0):
+            shape, _, _ = np.lib.format.read_array_header_2_0(f)
+            return shape
+    # Newer header versions: memory-map so only the header pages are touched
+    return np.load(feature_path, mmap_mode='r').shape
+
 def get_feature_metadata(feature_path: Path) -> Dict[str, Any]:
     """Extract metadata from a log-mel .npy file."""
     try:
@@ -20,9 +34,8 @@ def get_feature_metadata(feature_path: Path) -> Dict[str, Any]:
         task_id = stem_parts[-3] if len(stem_parts) >= 3 else 'unknown'    # t01
         slice_id = stem_parts[-1]                                          # w01
 
-        # Load .npy to get shape
-        data = np.load(feature_path)
-        n_mels, n_frames = data.shape
+        # Read shape from the .npy header only
+        n_mels, n_frames = read_npy_shape(feature_path)
 
         # Extract class from parent directory
         class_name = feature_path.parent.name
@@ -57,11 +70,9 @@ def generate_feature_metadata_csv(feature_dir: str, output_csv: str) -> None:
         print(f"No .npy feature files found in {feature_dir}")
         return
 
-    metadata = []
-    for ffile in feature_files:
-        meta = get_feature_metadata(ffile)
-        if meta:
-            metadata.append(meta)
+    with ThreadPoolExecutor() as executor:
+        results = executor.map(get_feature_metadata, feature_files)
+        metadata = [meta for meta in results if meta]
 
     # Sort by class, sample_id, slice_id
     metadata.sort(key=lambda x: (x['class'], x['sample_id'], x['slice_id']))
@@ -73,10 +84,7 @@ def generate_feature_metadata_csv(feature_dir: str, output_csv: str) -> None:
     ]
 
     # Write CSV
-    with open(output_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(metadata)
+    pd.DataFrame(metadata, columns=fieldnames).to_csv(output_path, index=False, encoding='utf-8')
 
     print(f"Generated metadata for {len(metadata)} feature files at {output_path}")
 
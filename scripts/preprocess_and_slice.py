@@ -15,6 +15,7 @@ Output: .m4a file becomes a cleaned .wav
 """
 
 import os
+import json
 from pathlib import Path
 import librosa
 import soundfile as sf
@@ -32,20 +33,45 @@ TRIM_SILENCE = True
 SILENCE_TOP_DB = 20       # dB threshold
 WINDOW_LENGTH_SEC = 2.0
 OVERLAP_SEC = 1.0
+WRITE_SLICE_SHARDS = False  # True: one int16 .npy shard per recording instead of one .wav per window
+SHARD_SUFFIX = "_slices"
+PCM16_SCALE = 32768.0     # float <-> int16 scale, same as libsndfile's PCM_16 WAV writes
 
 AUDIO_EXTS = ['*.m4a', '*.wav', '*.mp3', '*.flac']
 
 # --- Helper functions ---
 
+def load_audio(audio_path: Path, sr=TARGET_SR):
+    """Load audio as mono float32, decoding in-process with soundfile when possible.
+    
+    Falls back to librosa (FFmpeg via audioread) for formats libsndfile can't read, e.g. .m4a.
+    """
+    try:
+        y, file_sr = sf.read(audio_path, dtype='float32')
+    except Exception:
+        return librosa.load(audio_path, sr=sr, mono=True)
+    
+    if y.ndim > 1:
+        y = y.mean(axis=1)
+    if sr is not None and file_sr != sr:
+        y = librosa.resample(y, orig_sr=file_sr, target_sr=sr)
+        file_sr = sr
+    return y, file_sr
+
 def preprocess_audio_file(audio_path: Path, output_dir: Path):
-    """Preprocess a single audio file (mono, resample, normalize, trim)."""
+    """Preprocess a single audio file (mono, resample, normalize, trim).
+    
+    Returns (y, sr, out_file) so the caller can slice the cleaned signal without
+    re-reading it. y and sr are None if the clean file already existed, and all
+    three are None on error.
+    """
     out_file = output_dir / f"{audio_path.stem}_clean.wav"
     if out_file.exists():
         print(f"Skipping {audio_path.name}, already processed.")
-        return out_file
+        return None, None, out_file
     
     try:
-        y, sr = librosa.load(audio_path, sr=None, mono=True)
+        y, sr = load_audio(audio_path, sr=None)
         
         # Resample if needed
         if sr != TARGET_SR:
@@ -56,32 +82,106 @@ def preprocess_audio_file(audio_path: Path, output_dir: Path):
         if TRIM_SILENCE:
             y, _ = librosa.effects.trim(y, top_db=SILENCE_TOP_DB)
         
-        # Normalize
-        if np.max(np.abs(y)) > 0:
-            y = y / np.max(np.abs(y))
+        # Normalize (in place; trim returns a view, so nothing is copied)
+        peak = float(np.abs(y).max()) if y.size else 0.0
+        if peak > 0:
+            y *= 1.0 / peak
         
         output_dir.mkdir(parents=True, exist_ok=True)
         sf.write(out_file, y, sr)
         print(f"Saved preprocessed {out_file.name}")
-        return out_file
+        return y, sr, out_file
     except Exception as e:
         print(f"Error preprocessing {audio_path.name}: {e}")
-        return None
+        return None, None, None
+
+def write_slice_shard(windows, sr, stem: str, output_dir: Path):
+    """Write all windows of one recording to a single memory-mapped int16 .npy shard.
+    
+    A JSON sidecar records the sample rate, window geometry and slice ids so the
+    feature stage can name its outputs exactly as it would for per-window WAVs.
+    Samples are rounded to nearest, whereas libsndfile's PCM_16 writer floors, so
+    shard samples can differ from the WAV path's by 1 LSB and the resulting
+    features by a small fraction of a dB.
+    """
+    shard_file = output_dir / f"{stem}{SHARD_SUFFIX}.npy"
+    shard = np.lib.format.open_memmap(shard_file, mode='w+', dtype=np.int16, shape=windows.shape)
+    # Same 32768 scale and int16 clipping as the WAV path (rounding differs, see above)
+    pcm = np.rint(windows * PCM16_SCALE)
+    np.clip(pcm, -32768, 32767, out=pcm)
+    shard[:] = pcm
+    shard.flush()
+    del shard
+    
+    sidecar = {
+        "stem": stem,
+        "sample_rate": sr,
+        "window_samples": windows.shape[1],
+        "slice_ids": [f"w{i:02d}" for i in range(1, len(windows) + 1)],
+    }
+    with open(shard_file.with_suffix(".json"), "w", encoding="utf-8") as f:
+        json.dump(sidecar, f, indent=2)
+
+def slice_audio_array(y, sr, stem: str, output_dir: Path):
+    """Slice an in-memory mono signal into overlapping windows."""
+    try:
+        window_samples = int(WINDOW_LENGTH_SEC * sr)
+        hop_samples = int((WINDOW_LENGTH_SEC - OVERLAP_SEC) * sr)
+        
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Zero-copy (n_windows, window_samples) view; only the writes loop in Python
+        if len(y) >= window_samples:
+            windows = np.lib.stride_tricks.sliding_window_view(y, window_samples)[::hop_samples]
+        else:
+            windows = np.empty((0, window_samples), dtype=y.dtype)
+        
+        if WRITE_SLICE_SHARDS:
+            write_slice_shard(windows, sr, stem, output_dir)
+        else:
+            for i, y_slice in enumerate(windows, 1):
+                slice_file = output_dir / f"{stem}_w{i:02d}.wav"
+                sf.write(slice_file, y_slice, sr)
+        
+        print(f"Sliced {stem} into {len(windows)} windows")
+    except Exception as e:
+        print(f"Error slicing {stem}: {e}")
 
 def slice_audio_file(audio_path: Path, output_dir: Path):
-    """Slice a preprocessed audio file into overlapping windows."""
+    """Slice a preprocessed audio file into overlapping windows.
+    
+    16 kHz mono files are streamed from disk one window at a time, so memory stays
+    constant regardless of duration. Other files, and shard output, go through
+    load_audio + slice_audio_array.
+    """
+    try:
+        info = sf.info(audio_path)
+        streamable = info.samplerate == TARGET_SR and info.channels == 1
+    except Exception:
+        streamable = False
+    
+    if WRITE_SLICE_SHARDS or not streamable:
+        try:
+            y, sr = load_audio(audio_path)
+        except Exception as e:
+            print(f"Error slicing {audio_path.name}: {e}")
+            return
+        slice_audio_array(y, sr, audio_path.stem, output_dir)
+        return
+    
     try:
-        y, sr = librosa.load(audio_path, sr=TARGET_SR, mono=True)
-        total_samples = len(y)
+        sr = info.samplerate
         window_samples = int(WINDOW_LENGTH_SEC * sr)
         hop_samples = int((WINDOW_LENGTH_SEC - OVERLAP_SEC) * sr)
         
         output_dir.mkdir(parents=True, exist_ok=True)
         slice_count = 0
         
-        for start in range(0, total_samples - window_samples + 1, hop_samples):
-            end = start + window_samples
-            y_slice = y[start:end]
+        blocks = sf.blocks(str(audio_path), blocksize=window_samples,
+                           overlap=window_samples - hop_samples, dtype='float32')
+        for y_slice in blocks:
+            if len(y_slice) < window_samples:
+                break  # trailing partial window
             slice_count += 1
             slice_file = output_dir / f"{audio_path.stem}_w{slice_count:02d}.wav"
             sf.write(slice_file, y_slice, sr)
@@ -109,9 +209,11 @@ def run_pipeline(raw_dir: Path, clean_dir: Path, slices_dir: Path):
         audio_files = find_audio_files(class_dir)
         for audio_file in audio_files:
             # Step 3: Preprocess
-            preprocessed_file = preprocess_audio_file(audio_file, clean_class_dir)
-            if preprocessed_file:
-                # Step 4: Slice
+            y, sr, preprocessed_file = preprocess_audio_file(audio_file, clean_class_dir)
+            # Step 4: Slice (straight from memory; only re-read cached clean files)
+            if y is not None:
+                slice_audio_array(y, sr, preprocessed_file.stem, slices_class_dir)
+            elif preprocessed_file:
                 slice_audio_file(preprocessed_file, slices_class_dir)
 
 if __name__ == "__main__":
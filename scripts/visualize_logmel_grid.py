@@ -7,11 +7,21 @@ from pathlib import Path
 import random
 import argparse
 import math
+from concurrent.futures import ThreadPoolExecutor
+
+PREFETCH_THRESHOLD = 16  # Load files concurrently above this many samples
 
 def find_feature_files(feature_dir: Path):
     """Recursively find all .npy feature files."""
     return list(feature_dir.rglob('*.npy'))
 
+def load_feature(feature_path: Path):
+    """Memory-map a feature file and read it into a float32 array for plotting.
+    
+    Features may be stored as float16 or float32; matplotlib needs float32.
+    """
+    return np.load(feature_path, mmap_mode='r').astype(np.float32)
+
 def visualize_logmel_grid(feature_dir: Path, n_samples: int = 6, n_cols: int = 3):
     """Randomly select and plot log-mel slices in a grid."""
     feature_files = find_feature_files(feature_dir)
@@ -21,13 +31,21 @@ def visualize_logmel_grid(feature_dir: Path, n_samples: int = 6, n_cols: int = 3
         return
     
     sample_files = random.sample(feature_files, min(n_samples, len(feature_files)))
+    # Sorted (class, name) order reads files in directory order and groups classes in the grid
+    sample_files.sort(key=lambda f: (f.parent.name, f.name))
+    
+    # Read (and upcast) the files concurrently before plotting when there are many
+    if len(sample_files) > PREFETCH_THRESHOLD:
+        with ThreadPoolExecutor() as executor:
+            arrays = list(executor.map(load_feature, sample_files))
+    else:
+        arrays = [load_feature(f) for f in sample_files]
     n_rows = math.ceil(len(sample_files) / n_cols)
     
     fig, axes = plt.subplots(n_rows, n_cols, figsize=(n_cols*4, n_rows*3))
     axes = axes.flatten()
     
-    for ax, f in zip(axes, sample_files):
-        arr = np.load(f)
+    for ax, f, arr in zip(axes, sample_files, arrays):
         im = ax.imshow(arr, origin='lower', aspect='auto', cmap='magma')
         ax.set_title(f"{f.parent.name} / {f.name}", fontsize=8)
         ax.set_xlabel("Time")
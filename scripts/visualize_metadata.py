@@ -6,8 +6,8 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
 METADATA_CSV = PROJECT_ROOT / "dataset_clean_slices" / "metadata" / "slice_metadata.csv"
 
-# Load metadata
-df = pd.read_csv(METADATA_CSV)
+# Load metadata (only the column we plot)
+df = pd.read_csv(METADATA_CSV, usecols=["class"], dtype={"class": "category"})
 
 # Count slices per class
 class_counts = df["class"].value_counts().sort_index()